@@ -30,7 +30,6 @@ class MyBufferAgent(ReplayBufferAgent):  # TODO check if sumtree works faster
         probs /= probs.sum()
         
         self.batch_indices = np.random.choice(len(self), batch_size, p=probs, replace=True)   # do not use replace = False, it makes O(n)
-        samples = [self.buffer[idx] for idx in self.batch_indices] # seems like the fastest code for sampling!
         
         # calculating importance sampling weights to evade bias
         # these weights are annealed to be more like uniform at the beginning of learning
@@ -38,9 +37,8 @@ class MyBufferAgent(ReplayBufferAgent):  # TODO check if sumtree works faster
         # these weights are normalized as proposed in the original article to make loss function scale more stable.
         #weights /= (probs.min()) ** (-self.rp_beta_by_frame(self.frames_done))
        
-        states, actions, rewards, next_states, dones = zip(*samples)
         #self.logger["median weight"].append(np.median(weights))
-        return np.concatenate(states), actions, rewards, np.concatenate(next_states), dones, np.ones((batch_size))#weights
+        return self.get_transitions(torch.from_numpy(self.batch_indices)) + (Tensor(np.ones((batch_size))),)#weights
 
     def update_priorities(self, batch_priorities):
         """
@@ -51,17 +49,17 @@ class MyBufferAgent(ReplayBufferAgent):  # TODO check if sumtree works faster
         self.priorities[self.batch_indices] = 4 / (2 + np.exp(diff) + np.exp(-diff))
         
     def see(self, state, action, reward, next_state, done):
-        if len(self.buffer) > 0:        
+        if len(self) > 0:        
             for g in range(state.shape[0]):
-                t = (self.pos - (state.shape[0] - g)) % min(self.config.replay_buffer_capacity, len(self.buffer))
+                t = (self.pos - (state.shape[0] - g)) % len(self)
                 discount = self.config.gamma
-                while not self.buffer[t][4]:        # what if training was reset?
+                while not self.dones[t]:        # what if training was reset?
                     self.true_reward_to_go[t] += discount * reward[g]
                     discount *= self.config.gamma
                     
-                    t = (t - self.env.num_envs) % min(self.config.replay_buffer_capacity, len(self.buffer))
+                    t = (t - self.env.num_envs) % len(self)
                     
-                    if (t == (self.pos - (state.shape[0] - g)) % min(self.config.replay_buffer_capacity, len(self.buffer))):
+                    if (t == (self.pos - (state.shape[0] - g)) % len(self)):
                         break
         
         super().see(state, action, reward, next_state, done)
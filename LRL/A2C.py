@@ -9,10 +9,19 @@ class ActorCritic(Head):
         self.actor_head = self.linear(self.feature_size, config.num_actions)      
         self.critic_head = self.linear(self.feature_size, 1)
         
-    def forward(self, state):
+    def raw(self, state):
+        '''
+        Returns policy logits and values without constructing distribution
+        output: logits - Tensor, (batch_size x num_actions)
+        output: values - Tensor, (batch_size x 1)
+        '''
         features = self.feature_extractor_net(state)
-        return Categorical(logits=self.actor_head(features)), self.critic_head(features)
-        
+        return self.actor_head(features), self.critic_head(features)
+
+    def forward(self, state):
+        logits, value = self.raw(state)
+        return Categorical(logits=logits), value
+
 class SeparatedActorCritic(Head):
     '''Separate two nets for actor-critic '''
     def __init__(self, config, name):
@@ -25,10 +34,12 @@ class SeparatedActorCritic(Head):
             self.linear(self.feature_size, 1)
         )
         
+    def raw(self, state):
+        return self.head(self.feature_extractor_net(state)), self.critic(state)
+
     def forward(self, state):
-        value = self.critic(state)
-        probs = self.head(self.feature_extractor_net(state))
-        return Categorical(logits=probs), value
+        logits, value = self.raw(state)
+        return Categorical(logits=logits), value
 
 class FactorizedNormalActorCritic(Head):
     '''Actor-critic with shared feature extractor for continious action space'''
@@ -47,6 +58,58 @@ class FactorizedNormalActorCritic(Head):
         features = self.feature_extractor_net(state)
         return Normal(self.actor_head_mu(features), self.actor_head_sigma(features)), self.critic_head(features)
 
+@torch.jit.script
+def _compute_returns(rewards, dones, last_values, gamma: float):
+    """
+    Reverse scan of discounted returns, bootstrapped from last_values.
+    input: rewards - Tensor, (rollout x num_envs)
+    input: dones - Tensor, (rollout + 1 x num_envs)
+    input: last_values - Tensor, (num_envs x value_repr_shape)
+    output: Tensor, (rollout + 1 x num_envs x value_repr_shape)
+    """
+    # aligning rewards and dones with value representation
+    for _ in range(last_values.dim() - rewards.dim() + 1):
+        rewards = rewards.unsqueeze(-1)
+        dones = dones.unsqueeze(-1)
+    
+    # low-precision rollout buffers are upcasted first, otherwise gamma itself would be rounded
+    rewards = rewards.to(last_values.dtype)
+    
+    # discounts for all steps are computed by one kernel instead of one per step
+    discounts = gamma * (1 - dones.to(last_values.dtype))
+    
+    returns = [last_values]
+    for step in range(rewards.size(0) - 1, -1, -1):
+        returns.append(returns[-1] * discounts[step + 1] + rewards[step])
+    returns.reverse()
+    return torch.stack(returns)
+
+@torch.jit.script
+def _a2c_loss(returns, values, log_probs, entropy, critic_loss_weight: float, entropy_loss_weight: float):
+    """
+    Fused A2C loss with advantages computed once.
+    input: returns, values, log_probs, entropy - Tensors, (batch_size)
+    output: loss, actor_loss, critic_loss, entropy_loss - Tensors, (1)
+    """
+    advantages = returns.detach() - values
+    actor_loss = -(advantages.detach() * log_probs).mean()
+    critic_loss = (advantages * advantages).mean()
+    entropy_loss = -entropy.mean()
+    return actor_loss + critic_loss_weight * critic_loss + entropy_loss_weight * entropy_loss, actor_loss, critic_loss, entropy_loss
+
+@torch.jit.script
+def _logprob_entropy(logits, actions):
+    """
+    Log probabilities of taken actions and entropy of categorical policy with one log_softmax pass.
+    input: logits - Tensor, (batch_size x num_actions)
+    input: actions - LongTensor, (batch_size)
+    output: action_log_probs, entropy - Tensors, (batch_size)
+    """
+    log_probs = logits.log_softmax(-1)
+    action_log_probs = log_probs.gather(-1, actions.unsqueeze(-1)).squeeze(-1)
+    entropy = -(log_probs.exp() * log_probs).sum(-1)
+    return action_log_probs, entropy
+
 def A2C(parclass):
   """Requires parent class, inherited from Agent."""
     
@@ -61,10 +124,16 @@ def A2C(parclass):
         rollout - number of frames for one iteration of updating NN weights
         entropy_loss_weight - weight of additional entropy loss
         critic_loss_weight - weight of critic loss
+        device - device to keep policy, rollout buffers and all tensors of updates on, str
+        use_torch_compile - whether to compile policy with torch.compile, bool
+        allow_tf32 - if given, globally sets whether TF32 matmuls are allowed on Ampere+ GPUs, bool
+        bf16_rollout - whether to store rollout rewards and dones in bfloat16 (rewards keep only ~3 significant digits), bool
     """
     __doc__ += parclass.__doc__
     PARAMS = parclass.PARAMS | Head.PARAMS("ActorCritic") | {"ActorCriticHead", "rollout", 
-                                                             "entropy_loss_weight", "critic_loss_weight"} 
+                                                             "entropy_loss_weight", "critic_loss_weight",
+                                                             "device", "use_torch_compile", "allow_tf32",
+                                                             "bf16_rollout"} 
     
     def __init__(self, config):
         super().__init__(config)
@@ -73,33 +142,78 @@ def A2C(parclass):
         self.config.setdefault("rollout", 5)
         self.config.setdefault("critic_loss_weight", 1)
         self.config.setdefault("entropy_loss_weight", 0)
+        self.config.setdefault("device", device)
+        self.config.setdefault("use_torch_compile", False)
+        self.config.setdefault("bf16_rollout", False)
         self.config["value_repr_shape"] = ()
         
-        self.policy = self.config.ActorCriticHead(self.config, "ActorCritic").to(device)
+        if "allow_tf32" in self.config:
+            torch.backends.cuda.matmul.allow_tf32 = self.config.allow_tf32
+        
+        self.policy = self.config.ActorCriticHead(self.config, "ActorCritic").to(self.config.device)
         self.policy.init_optimizer()
+
+        # categorical heads expose raw logits, so rollout can be processed without distribution objects
+        self.discrete_policy = hasattr(self.policy, "raw")
+
+        if self.config.use_torch_compile:
+            # compiled in place, so state_dict keys and head methods stay untouched
+            self.policy.compile()
+            if self.discrete_policy:
+                self.policy.raw = torch.compile(self.policy.raw)
+        
+        # rollout buffers are created right on the device, so update does no host-to-device transfers
+        self.observations = torch.zeros((self.config.rollout + 1, self.env.num_envs, *self.config.observation_shape), device=self.config.device)
+        # bfloat16 halves rollout memory but rounds rewards; return scans upcast these buffers to float32 values dtype
+        rollout_dtype = torch.bfloat16 if self.config.bf16_rollout else torch.float32
+        self.rewards = torch.zeros((self.config.rollout, self.env.num_envs), dtype=rollout_dtype, device=self.config.device)
+        self.actions = torch.zeros((self.config.rollout + 1, self.env.num_envs, *self.config.actions_shape), dtype=self.action_dtype, device=self.config.device)
+        self.dones = torch.zeros((self.config.rollout + 1, self.env.num_envs), dtype=rollout_dtype, device=self.config.device)
+        
+        # flattened views over the whole rollout are created once; buffers are contiguous and never reallocated
+        self.observations_flat = self.observations.view(-1, *self.config.observation_shape)
+        self.actions_flat = self.actions.view(-1, *self.config.actions_shape)
         
-        self.observations = Tensor(size=(self.config.rollout + 1, self.env.num_envs, *self.config.observation_shape)).zero_()
-        self.rewards = Tensor(size=(self.config.rollout, self.env.num_envs)).zero_()
-        self.actions = self.ActionTensor(size=(self.config.rollout + 1, self.env.num_envs, *self.config.actions_shape)).zero_()
-        self.dones = Tensor(size=(self.config.rollout + 1, self.env.num_envs)).zero_()
+        # pinned staging buffers of known shapes for transitions coming to see, with numpy views to fill them
+        self.actions_stage = torch.empty((self.env.num_envs, *self.config.actions_shape), dtype=self.action_dtype, pin_memory=USE_CUDA)
+        self.rewards_stage = torch.empty((self.env.num_envs,), pin_memory=USE_CUDA)
+        self.dones_stage = torch.empty((self.env.num_envs,), pin_memory=USE_CUDA)
+        self.actions_stage_np, self.rewards_stage_np, self.dones_stage_np = self.actions_stage.numpy(), self.rewards_stage.numpy(), self.dones_stage.numpy()
+        # staging buffers are refilled only after previous asynchronous copies from them are finished;
+        # copies are enqueued on the current stream of rollout buffers device, so event belongs to that device too
+        self.stage_copied = None
+        if self.actions.is_cuda:
+            with torch.cuda.device(self.actions.device):
+                self.stage_copied = torch.cuda.Event()
         self.step = 0
+        self.single_discrete_env = self.env.num_envs == 1 and self.config.actions_shape == ()
+        
+        # fused loss computes exactly the terms below, so it is used only while subclasses do not redefine them
+        self.fused_loss = all(getattr(type(self), term) is getattr(A2C, term) for term in ("optimized_function", "critic_loss", "entropy_loss"))
         
         self.logger_labels["actor_loss"] = ("training iteration", "loss")
         self.logger_labels["critic_loss"] = ("training iteration", "loss")
         self.logger_labels["entropy_loss"] = ("training iteration", "loss")
 
     def act(self, s):
-        if self.is_learning:
-            self.policy.train()
-        else:
-            self.policy.eval()
+        # switching mode walks all submodules, so it is done only when mode actually changes
+        if self.policy.training != self.is_learning:
+            self.policy.train(self.is_learning)
         
         with torch.no_grad():
-            dist, values = self.policy(Tensor(s))
-            actions = dist.sample()
+            state = torch.as_tensor(s, dtype=torch.float32).to(self.config.device, non_blocking=True)
+            if self.discrete_policy:
+                # Gumbel-max trick: argmax of logits perturbed with Gumbel noise is a sample from softmax(logits)
+                logits, values = self.policy.raw(state)
+                actions = (logits - torch.empty_like(logits).exponential_().log()).argmax(dim=-1)
+                probs = logits.softmax(dim=-1) if self.is_recording else None
+            else:
+                dist, values = self.policy(state)
+                actions = dist.sample()
+                probs = dist.probs if self.is_recording else None
             
             if self.is_recording:
-                self.record["policies"].append(dist.probs.cpu().numpy())
+                self.record["policies"].append(probs.cpu().numpy())
                 self.record["values"].append(values.cpu().numpy())
 
         return actions.cpu().numpy()
@@ -107,11 +221,28 @@ def A2C(parclass):
     def see(self, state, action, reward, next_state, done):
         super().see(state, action, reward, next_state, done)
         
-        self.observations[self.step].copy_(Tensor(state))
-        self.observations[self.step + 1].copy_(Tensor(next_state))
-        self.actions[self.step].copy_(self.ActionTensor(action))
-        self.rewards[self.step].copy_(Tensor(reward))
-        self.dones[self.step + 1].copy_(Tensor(done.astype(np.float32)))
+        # from_numpy only aliases numpy memory; copy_ casts to buffer dtype and moves to device.
+        self.observations[self.step].copy_(torch.from_numpy(np.ascontiguousarray(state)), non_blocking=True)
+        # next state of this frame is the state of the next one, so it is needed only at the end of rollout
+        if self.step == self.config.rollout - 1:
+            self.observations[self.step + 1].copy_(torch.from_numpy(np.ascontiguousarray(next_state)), non_blocking=True)
+        if self.single_discrete_env:
+            # scalar fills need neither tensor wrappers nor host-to-device copies
+            self.actions[self.step, 0] = int(action[0])
+            self.rewards[self.step, 0] = float(reward[0])
+            self.dones[self.step + 1, 0] = float(done[0])
+        else:
+            if self.stage_copied is not None:
+                self.stage_copied.synchronize()
+            np.copyto(self.actions_stage_np, action)
+            np.copyto(self.rewards_stage_np, reward)
+            np.copyto(self.dones_stage_np, done)
+            
+            self.actions[self.step].copy_(self.actions_stage, non_blocking=True)
+            self.rewards[self.step].copy_(self.rewards_stage, non_blocking=True)
+            self.dones[self.step + 1].copy_(self.dones_stage, non_blocking=True)
+            if self.stage_copied is not None:
+                self.stage_copied.record(torch.cuda.current_stream(self.actions.device))
         
         self.step = (self.step + 1) % self.config.rollout        
         if self.step == 0:
@@ -121,23 +252,24 @@ def A2C(parclass):
         '''
         Fills self.returns using self.values, self.rewards, self.dones
         '''
-        d = len(self.config.value_repr_shape)
-         
-        self.returns[-1] = self.values[-1]
-        for step in reversed(range(self.rewards.size(0))):
-            self.returns[step] = self.returns[step + 1] * self.config.gamma * (1 - align(self.dones[step + 1], d)) + align(self.rewards[step], d)
+        self.returns = _compute_returns(self.rewards, self.dones, self.values[-1], self.config.gamma)
             
     def preprocess_rollout(self):
-        """Calculates action_dist, values, action_log_probs, returns based on current rollout"""
-        self.policy.train()
-        
-        self.action_dist, self.values = self.policy(self.observations.view(-1, *self.config.observation_shape))
-        self.action_log_probs = self.action_dist.log_prob(self.actions.view(-1, *self.config.actions_shape))#.sum(dim=-1)    
-        
+        """Calculates action_logits or action_dist, values, action_log_probs, action_entropy, returns based on current rollout"""
+        if not self.policy.training:
+            self.policy.train()
+
+        if self.discrete_policy:
+            self.action_logits, self.values = self.policy.raw(self.observations_flat)
+            self.action_log_probs, self.action_entropy = _logprob_entropy(self.action_logits, self.actions_flat)
+        else:
+            self.action_dist, self.values = self.policy(self.observations_flat)
+            self.action_log_probs = self.action_dist.log_prob(self.actions_flat)#.sum(dim=-1)
+            self.action_entropy = self.action_dist.entropy()
+
         self.values = self.values.view(self.config.rollout + 1, self.env.num_envs, *self.config.value_repr_shape)
         self.action_log_probs = self.action_log_probs.view(self.config.rollout + 1, self.env.num_envs)
         
-        self.returns = torch.zeros_like(self.values)  # TODO: move to __init__?
         self.compute_returns()
         
     def optimized_function(self):
@@ -165,20 +297,25 @@ def A2C(parclass):
     def gradient_ascent_step(self):
         """Makes one update of policy weights"""
         
-        # calculating loss        
-        actor_loss = self.optimized_function().mean()
-        critic_loss = self.critic_loss().mean()        
-        entropy_loss = self.entropy_loss().mean()
-        
-        loss = actor_loss + self.config.critic_loss_weight * critic_loss + self.config.entropy_loss_weight * entropy_loss
+        # calculating loss
+        if self.fused_loss:
+            loss, actor_loss, critic_loss, entropy_loss = _a2c_loss(self.returns_b, self.values_b, self.action_log_probs_b, self.entropy_b,
+                                                                    float(self.config.critic_loss_weight), float(self.config.entropy_loss_weight))
+        else:
+            actor_loss = self.optimized_function().mean()
+            critic_loss = self.critic_loss().mean()        
+            entropy_loss = self.entropy_loss().mean()
+            
+            loss = actor_loss + self.config.critic_loss_weight * critic_loss + self.config.entropy_loss_weight * entropy_loss
         
         # making a step of optimization
         self.policy.optimize(loss)
         
-        # logging
-        self.logger["actor_loss"].append(actor_loss.item())
-        self.logger["critic_loss"].append(self.config.critic_loss_weight * critic_loss.item())
-        self.logger["entropy_loss"].append(self.config.entropy_loss_weight * entropy_loss.item())
+        # logging: losses are transferred to host together, with one synchronization instead of three
+        actor_loss, critic_loss, entropy_loss = torch.stack([actor_loss.detach(), critic_loss.detach(), entropy_loss.detach()]).tolist()
+        self.logger["actor_loss"].append(actor_loss)
+        self.logger["critic_loss"].append(self.config.critic_loss_weight * critic_loss)
+        self.logger["entropy_loss"].append(self.config.entropy_loss_weight * entropy_loss)
     
     def update(self):
         """One step of optimization based on rollout memory"""
@@ -189,7 +326,7 @@ def A2C(parclass):
         self.returns_b = self.returns[:-1].view(-1)
         self.values_b = self.values[:-1].view(-1)
         self.action_log_probs_b = self.action_log_probs[:-1].view(-1)    
-        self.entropy_b = self.action_dist.entropy()[:-1].view(-1)    #TODO .sum(dim=-1) inside?
+        self.entropy_b = self.action_entropy[:-1].view(-1)    #TODO .sum(dim=-1) inside?
         
         self.gradient_ascent_step()        
         
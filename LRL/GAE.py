@@ -1,4 +1,4 @@
-from . import A2C
+from .A2C import *
 
 def GAE(parclass):
   """Requires parent class, inherited from A2C.
@@ -22,9 +22,15 @@ def GAE(parclass):
         assert self.config.gae_tau > 0 and self.config.gae_tau <= 1, "Gae Tau must lie in (0, 1]"
     
     def compute_returns(self):
+        self.returns = torch.zeros_like(self.values)
+        
+        # rollout buffers may be bfloat16 (bf16_rollout); scan is done in dtype of values
+        rewards = self.rewards.to(self.values.dtype)
+        not_dones = 1 - self.dones.to(self.values.dtype)
+        
         gae = 0
-        for step in reversed(range(self.rewards.size(0))): # just some arithmetics ;)
-            delta = self.rewards[step] + self.config.gamma * self.values[step + 1] * (1 - self.dones[step + 1]) - self.values[step]
-            gae = delta + self.config.gamma * self.config.gae_tau * (1 - self.dones[step + 1]) * gae
+        for step in reversed(range(rewards.size(0))): # just some arithmetics ;)
+            delta = rewards[step] + self.config.gamma * self.values[step + 1] * not_dones[step + 1] - self.values[step]
+            gae = delta + self.config.gamma * self.config.gae_tau * not_dones[step + 1] * gae
             self.returns[step] = gae + self.values[step]
   return GAE
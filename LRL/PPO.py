@@ -66,9 +66,9 @@ def PPO(parclass):
                 #self.advantages_b = self.advantages.view(-1)[indices]  # КОСТЫЛЬ
                 
                 # calculating current value, action_log_prob, entropy
-                dist, self.values_b = self.policy(self.observations.view(-1, *self.config.observation_shape)[indices])
+                dist, self.values_b = self.policy(self.observations_flat[indices])
                 self.values_b = self.values_b.squeeze()  # IMPORTANT ([32] - [32, 1] problem)
-                self.action_log_probs_b = dist.log_prob(self.actions.view(-1, *self.config.actions_shape)[indices])#.sum(dim=-1)        
+                self.action_log_probs_b = dist.log_prob(self.actions_flat[indices])#.sum(dim=-1)        
                 self.entropy_b = dist.entropy()#.sum(dim=-1)
                 
                 # performing step
@@ -8,9 +8,13 @@ class QuantileActorCritic(Head):
         self.actor_head = self.linear(self.feature_size, config.num_actions)      
         self.critic_head = self.linear(self.feature_size, config.quantiles)
         
-    def forward(self, state):
+    def raw(self, state):
         features = self.feature_extractor_net(state)
-        return Categorical(logits=self.actor_head(features)), self.critic_head(features)
+        return self.actor_head(features), self.critic_head(features)
+        
+    def forward(self, state):
+        logits, value = self.raw(state)
+        return Categorical(logits=logits), value
 
 def QRAAC(parclass):
   """
@@ -39,7 +43,7 @@ def QRAAC(parclass):
         return self.returns_b.detach().mean(dim=-1) - self.values_b.mean(dim=-1)
     
     def critic_loss(self):
-        tau = Tensor((2 * np.arange(self.config.quantiles) + 1) / (2.0 * self.config.quantiles))         
+        tau = torch.as_tensor((2 * np.arange(self.config.quantiles) + 1) / (2.0 * self.config.quantiles), dtype=torch.float32, device=self.config.device)         
         diff = self.returns_b.detach().t()[:, :, None] - self.values_b[None]        
         return (diff * (tau.view(1, -1) - (diff < 0).float())).transpose(0,1).mean(1).sum(-1)
     
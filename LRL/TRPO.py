@@ -43,8 +43,8 @@ def TRPO(parclass):
     
     def surrogate_function(self, write_to_log=False):
         # evaluate new policy
-        self.new_action_dist, self.new_values = self.policy(self.observations.view(-1, *self.config.observation_shape))
-        self.new_action_log_probs = self.new_action_dist.log_prob(self.actions.view(-1, *self.config.actions_shape))#.sum(dim=-1)
+        self.new_action_dist, self.new_values = self.policy(self.observations_flat)
+        self.new_action_log_probs = self.new_action_dist.log_prob(self.actions_flat)#.sum(dim=-1)
         
         # constructing current batch
         self.new_values = self.new_values.view(self.config.rollout + 1, self.env.num_envs, *self.config.value_repr_shape)
@@ -52,7 +52,7 @@ def TRPO(parclass):
                 
         self.new_values_b = self.new_values[:-1].view(-1)
         self.new_action_log_probs_b = self.new_action_log_probs[:-1].view(-1)    
-        self.new_entropy_b = self.action_dist.entropy()[:-1].view(-1)
+        self.new_entropy_b = self.action_entropy[:-1].view(-1)
         
         # calculating loss        
         actor_loss = self.optimized_function().mean()
@@ -71,7 +71,8 @@ def TRPO(parclass):
     
     def mean_kl_divergence(self):
         """returns an estimate of the average KL divergence between a model used to collect roll-out and self.policy"""
-        kl_policy = torch.sum(self.action_dist.probs.detach() * (self.action_dist.logits.detach() - self.new_action_dist.logits), dim=1)
+        old_log_probs = self.action_logits.detach().log_softmax(dim=1)
+        kl_policy = torch.sum(old_log_probs.exp() * (old_log_probs - self.new_action_dist.logits), dim=1)
         assert (kl_policy > -0.001).all(), "WTF?"
         
         kl_policy = kl_policy.mean()
@@ -105,7 +106,7 @@ def TRPO(parclass):
         x = np.zeros_like(b)
         rdotr = r.dot(r)
         for _ in range(self.config.cg_iters):
-          z = self.hessian_vector_product(Tensor(p)).squeeze(0).cpu().numpy()
+          z = self.hessian_vector_product(torch.as_tensor(p, dtype=torch.float32, device=self.config.device)).squeeze(0).cpu().numpy()
           v = rdotr / p.dot(z)
           x += v * p
           r -= v * z
@@ -132,7 +133,7 @@ def TRPO(parclass):
             
         for (_n_backtracks, stepfrac) in enumerate(0.5**np.arange(max_backtracks)):
             xnew = x.data.cpu().numpy() + stepfrac * fullstep
-            vector_to_parameters(Tensor(xnew), self.policy.parameters())
+            vector_to_parameters(torch.as_tensor(xnew, dtype=torch.float32, device=self.config.device), self.policy.parameters())
             with torch.no_grad():
                 newfval = self.surrogate_function().mean()
             actual_improve = fval - newfval
@@ -143,7 +144,7 @@ def TRPO(parclass):
                 #print("Accepted")
                 self.logger["acceptance_ratio"].append(ratio)
                 self.logger["expected_improvement"].append(expected_improve_rate)
-                return Tensor(xnew)
+                return torch.as_tensor(xnew, dtype=torch.float32, device=self.config.device)
         
         raise Exception("Line search error")
         return x   
@@ -164,10 +165,10 @@ def TRPO(parclass):
         step_direction = self.conjugate_gradient(-policy_gradient.cpu().numpy())
 
         # Do line search to determine the stepsize of theta in the direction of step_direction
-        shs = step_direction.dot(self.hessian_vector_product(Tensor(step_direction)).cpu().numpy().T) / 2
+        shs = step_direction.dot(self.hessian_vector_product(torch.as_tensor(step_direction, dtype=torch.float32, device=self.config.device)).cpu().numpy().T) / 2
         lm = np.sqrt(shs / self.config.max_kl)
         fullstep = step_direction / lm
-        gdotstepdir = -policy_gradient.dot(Tensor(step_direction)).data[0]
+        gdotstepdir = -policy_gradient.dot(torch.as_tensor(step_direction, dtype=torch.float32, device=self.config.device)).data[0]
         theta = self.linesearch(parameters_to_vector(self.policy.parameters()), fullstep, gdotstepdir / lm)
 
         # Update parameters of policy model
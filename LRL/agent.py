@@ -44,10 +44,12 @@ class Agent(Logger):
             self.config["num_actions"] = self.env.action_space.n
             self.config["actions_shape"] = ()
             self.ActionTensor = LongTensor
+            self.action_dtype = torch.long
         else:
             self.config["num_actions"] = np.array(self.env.action_space.shape).prod()
             self.config["actions_shape"] = self.env.action_space.shape
             self.ActionTensor = Tensor
+            self.action_dtype = torch.float32
         
         # logging and initialization
         self.initialized = False
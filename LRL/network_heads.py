@@ -31,7 +31,8 @@ class Head(nn.Module):
         self.name = name
         self.config = config
         self.linear = config.get(name + "_linear", nn.Linear)
-        self.feature_extractor_net = config[name + "_FeatureExtractor"](self.linear).to(device)
+        self.device = config.get("device", device)
+        self.feature_extractor_net = config[name + "_FeatureExtractor"](self.linear).to(self.device)
         self.feature_size = self.get_feature_size()
         self.optimization_steps_done = 0
         
@@ -62,7 +63,7 @@ class Head(nn.Module):
         Returns feature size of self.feature_extractor_net
         output: feature_size - int
         '''
-        return self.feature_extractor_net(Tensor(size=(10, *self.config["observation_shape"]))).size()[1]
+        return self.feature_extractor_net(torch.zeros((10, *self.config["observation_shape"]), device=self.device)).size()[1]
         
     def average_magnitude(self):
         '''
@@ -104,9 +104,6 @@ class PrioritizedBufferAgent(ReplayBufferAgent):  # TODO check if sumtree works
         # sample batch_size indices
         self.batch_indices = np.array([self.priorities.get_leaf(np.random.uniform(0, self.priorities.total_p)) for _ in range(batch_size)])
         
-        # get transitions with these indices
-        samples = [self.buffer[idx] for idx in self.batch_indices] # seems like the fastest code for sampling!
-        
         # get priorities of these transitions
         batch_priorities = self.priorities[self.batch_indices] # such indexing is correct for our sumtree implementation
         
@@ -116,14 +113,10 @@ class PrioritizedBufferAgent(ReplayBufferAgent):  # TODO check if sumtree works
         # these weights are normalized as proposed in the original article to make loss function scale more stable.
         weights /= batch_priorities.min() ** (-self.rp_beta_by_frame(self.frames_done))
        
-        state, action, reward, next_state, done = zip(*samples)
         self.logger["median weight"].append(np.median(weights))
-        return (Tensor(np.concatenate(state)), 
-                self.ActionTensor(action), 
-                Tensor(reward), 
-                Tensor(np.concatenate(next_state)), 
-                Tensor(done), 
-                Tensor(weights))
+        
+        # get transitions with these indices
+        return self.get_transitions(torch.from_numpy(self.batch_indices)) + (Tensor(weights),)
 
     def update_priorities(self, batch_priorities):
         """
@@ -3,22 +3,44 @@ from .agent import *
 class ReplayBufferAgent(Agent):
     """
     Replay Memory storing all transitions seen with basic uniform batch sampling.
+    Storage for the whole capacity is allocated on creation, with states and next states kept separately:
+    e.g. 1e6 transitions of (1, 84, 84) uint8 frames take about 14GB of RAM.
     Based on: https://arxiv.org/abs/1312.5602
     
     Args:
         replay_buffer_capacity - size of buffer, int
+        obs_dtype - torch dtype for storing observations, torch.uint8 for raw image frames or torch.float32
     """
     __doc__ += Agent.__doc__
-    PARAMS = Agent.PARAMS | {"replay_buffer_capacity"}
+    PARAMS = Agent.PARAMS | {"replay_buffer_capacity", "obs_dtype"}
     
     def __init__(self, config):
         super().__init__(config)
         
         self.config.setdefault("replay_buffer_capacity", 100000)
         
+        # uint8 image frames are kept as bytes: lossless and 4 times less memory and bandwidth than float32
+        space = self.env.observation_space
+        raw_frames = isinstance(space, gym.spaces.Box) and space.dtype == np.uint8 and len(space.shape) >= 2
+        self.config.setdefault("obs_dtype", torch.uint8 if raw_frames else torch.float32)
+        
         self.config.replay_buffer_nsteps = 1
-        self.buffer = []
+        
+        # transitions are stored field-wise in preallocated tensors (structure of arrays),
+        # so that sampling a batch is one gather per field instead of a python loop.
+        # storage is pageable: only batch-sized staging buffers are page-locked.
+        capacity = self.config.replay_buffer_capacity
+        self.states      = torch.empty((capacity, *self.config.observation_shape), dtype=self.config.obs_dtype)
+        self.actions     = torch.empty((capacity, *self.config.actions_shape), dtype=self.action_dtype)
+        self.rewards     = torch.empty((capacity,), dtype=torch.float32)
+        self.next_states = torch.empty((capacity, *self.config.observation_shape), dtype=self.config.obs_dtype)
+        self.dones       = torch.empty((capacity,), dtype=torch.float32)
         self.pos = 0
+        self.size = 0
+        
+        # pinned buffers the sampled batch is gathered into before asynchronous transfer to device
+        self.batch_stage = None
+        self.batch_copied = torch.cuda.Event() if USE_CUDA else None
     
     def memorize_transition(self, state, action, reward, next_state, done):
         """
@@ -29,18 +51,15 @@ class ReplayBufferAgent(Agent):
         input: next_state - numpy array, (observation_shape)
         input: done - 0 or 1
         """
+        self.states[self.pos].copy_(torch.from_numpy(state))
+        self.actions[self.pos] = torch.as_tensor(action)
+        self.rewards[self.pos] = float(reward)
+        self.next_states[self.pos].copy_(torch.from_numpy(next_state))
+        self.dones[self.pos] = float(done)
         
-        # preparing for concatenation into batch in future
-        state      = np.expand_dims(state, 0)
-        next_state = np.expand_dims(next_state, 0)
-        
-        # this turned out to be the quickest way of working with experience memory
-        if len(self) < self.config.replay_buffer_capacity:
-            self.buffer.append((state, action, reward, next_state, done))
-        else:
-            self.buffer[self.pos] = (state, action, reward, next_state, done)
-        
+        # writes go to preallocated storage whether buffer is full or not, so no branching is needed
         self.pos = (self.pos + 1) % self.config.replay_buffer_capacity
+        self.size = min(self.size + 1, self.config.replay_buffer_capacity)
     
     def memorize(self, state, action, reward, next_state, done):
         """
@@ -69,27 +88,56 @@ class ReplayBufferAgent(Agent):
         output: done_batch - Tensor, (batch_size)
         output: weights_batch - Tensor, (batch_size)
         """
-        state, action, reward, next_state, done = zip(*random.sample(self.buffer, batch_size))
-        return (Tensor(np.concatenate(state)), 
-                self.ActionTensor(action), 
-                Tensor(reward), 
-                Tensor(np.concatenate(next_state)), 
-                Tensor(done), 
-                Tensor(np.ones((batch_size))))
+        # sampling with replacement: one vectorized call, same numpy RNG as other buffers use
+        indices = np.random.randint(0, len(self), size=batch_size)
+        return self.get_transitions(torch.from_numpy(indices)) + (Tensor(np.ones((batch_size))),)
+    
+    def get_transitions(self, indices):
+        """
+        Gather stored transitions with given indices and move them to device.
+        input: indices - LongTensor, (batch_size)
+        output: state_batch, action_batch, reward_batch, next_state_batch, done_batch - Tensors
+        """
+        storages = (self.states, self.actions, self.rewards, self.next_states, self.dones)
+        
+        if USE_CUDA:
+            # previous batch must be fully transferred before staging buffers are refilled
+            self.batch_copied.synchronize()
+            if self.batch_stage is None or self.batch_stage[0].size(0) != len(indices):
+                self.batch_stage = [torch.empty((len(indices), *storage.shape[1:]), dtype=storage.dtype, pin_memory=True) for storage in storages]
+            
+            for storage, stage in zip(storages, self.batch_stage):
+                torch.index_select(storage, 0, indices, out=stage)
+            batch = [stage.to(device, non_blocking=True) for stage in self.batch_stage]
+            self.batch_copied.record()
+        else:
+            batch = [storage[indices] for storage in storages]
+        
+        # compact observations are transferred as is and casted to float already on device
+        state_b, action_b, reward_b, next_state_b, done_b = batch
+        return state_b.float(), action_b, reward_b, next_state_b.float(), done_b
     
     def update_priorities(self, batch_priorities):  # TODO: what is this thing?
         pass
     
     def __len__(self):
-        return len(self.buffer)
+        return self.size
     
     def read_memory(self, mem_f):
-        self.buffer = pickle.load(mem_f)
         self.pos = pickle.load(mem_f)
+        self.size = pickle.load(mem_f)
+        assert self.size <= self.config.replay_buffer_capacity, "Stored memory is bigger than replay_buffer_capacity!"
+        
+        for storage in (self.states, self.actions, self.rewards, self.next_states, self.dones):
+            storage[:self.size].copy_(torch.from_numpy(np.load(mem_f)))
     
     def write_memory(self, mem_f):
-        pickle.dump(self.buffer, mem_f)
         pickle.dump(self.pos, mem_f)
+        pickle.dump(self.size, mem_f)
+        
+        # each field is streamed as one raw contiguous array, only the filled part of buffer is stored
+        for storage in (self.states, self.actions, self.rewards, self.next_states, self.dones):
+            np.save(mem_f, storage[:self.size].numpy())
     
     def save(self, name, save_replay_memory=False):
         super().save(name)
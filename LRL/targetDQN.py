@@ -9,30 +9,49 @@ def TargetQAgent(parclass):
     
     Args:
         target_update - frequency in frames of updating target network
+        target_tau - if given, target network is instead softly updated on each see call (i.e. every num_envs frames)
+                     as target = target_tau * target + (1 - target_tau) * online, so it is the retention factor of target net, float, from 0 to 1 (e.g. 0.995)
     '''
     __doc__ += parclass.__doc__
-    PARAMS = parclass.PARAMS | {"target_update"}
+    PARAMS = parclass.PARAMS | {"target_update", "target_tau"}
     
     def __init__(self, config):
         super().__init__(config)
 
+        self.config.setdefault("target_update", 100)
+        self.config.setdefault("target_tau", None)
+
         self.target_net = self.config.QnetworkHead(self.config, "Qnetwork").to(device)  # It is not correct for DDPG.
+        self.target_net.requires_grad_(False)  # target net is never optimized, autograd should not track it
+        
+        # both nets have the same architecture, so their tensors are paired once and updated together with foreach kernels
+        self.target_params, self.source_params = list(self.target_net.parameters()), list(self.q_net.parameters())
+        self.target_buffers, self.source_buffers = list(self.target_net.buffers()), list(self.q_net.buffers())
         self.unfreeze()
 
-        self.config.setdefault("target_update", 100)
-
     def unfreeze(self):
         '''copy policy net weights to target net'''
-        self.target_net.load_state_dict(self.q_net.state_dict())
+        with torch.no_grad():
+            torch._foreach_copy_(self.target_params + self.target_buffers, self.source_params + self.source_buffers)
+    
+    def soft_unfreeze(self):
+        '''move target net weights towards policy net weights'''
+        with torch.no_grad():
+            torch._foreach_lerp_(self.target_params, self.source_params, 1 - self.config.target_tau)
+            if self.target_buffers:
+                torch._foreach_copy_(self.target_buffers, self.source_buffers)
 
     def see(self, state, action, reward, next_state, done):
         super().see(state, action, reward, next_state, done)
 
-        if self.frames_done % self.config.target_update < self.env.num_envs:
+        if self.config.target_tau is not None:
+            self.soft_unfreeze()
+        elif self.frames_done % self.config.target_update < self.env.num_envs:
             self.unfreeze()
     
     def estimate_next_state(self, next_state_b):
-        return self.target_net.value(self.target_net(next_state_b))
+        with torch.inference_mode():
+            return self.target_net.value(self.target_net(next_state_b))
 
     def load(self, name, *args, **kwargs):
         super().load(name, *args, **kwargs)